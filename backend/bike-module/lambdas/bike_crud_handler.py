@@ -1,58 +1,69 @@
 import json
-import boto3
 import os
 import uuid
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from boto3.dynamodb.conditions import Key
 from decimal import Decimal
-
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Decimal):
-            return float(o)
-        return super(DecimalEncoder, self).default(o)
+from common.aws import DDB_RESOURCE, parse_body, respond
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # DynamoDB setup
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ["DYNAMODB_TABLE"])
+table = DDB_RESOURCE.Table(os.environ["DYNAMODB_TABLE"])
+bookings_table = DDB_RESOURCE.Table(os.environ.get("BOOKINGS_TABLE", "DALScooterBookings"))
+
+# Attributes the bike read endpoints return; audit fields stay in the table
+BIKE_PROJECTION = {
+    "ProjectionExpression": "bikeId, #type, model, accessCode, batteryLife, hourlyRate, discount, features, #status",
+    "ExpressionAttributeNames": {"#type": "type", "#status": "status"}
+}
 
 def lambda_handler(event, context):
-    logger.info(f"Received event: {json.dumps(event)}")
-    method = event["requestContext"]["http"].get("method")
-    path = event["rawPath"]
-    path_params = event.get("pathParameters") or {}
+    # Serializing the whole event is only worth paying for when debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received event: %s", json.dumps(event))
+    route = ROUTES.get(event.get("routeKey"))
 
     try:
-        if method == "GET" and path == "/bikes":
-            return list_bikes()
-
-        if method == "GET" and path.startswith("/bikes/") and path.endswith("/availability"):
-            bike_id = path_params.get("bikeId")
-            return check_bike_availability(bike_id, event.get("queryStringParameters", {}) or {})
-
-        if method == "POST" and path == "/bikes":
-            return create_bike(json.loads(event["body"]))
-
-        if method == "PUT" and path.startswith("/bikes/"):
-            return update_bike(path_params.get("bikeId"), json.loads(event["body"]))
-
-        if method == "DELETE" and path.startswith("/bikes/"):
-            return delete_bike(path_params.get("bikeId"))
-
-        return respond(400, {"message": "Invalid route or method."})
+        if route is None:
+            return respond(400, {"message": "Invalid route or method."})
+        return route(event)
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         return respond(500, {"error": str(e)})
 
-def list_bikes():
+def read_all(read, **params):
+    """
+    Call a Table query/scan until LastEvaluatedKey runs out; a single call
+    stops at 1 MB of data and would silently truncate the listing.
+    """
+    items = []
+    while True:
+        response = read(**params)
+        items.extend(response["Items"])
+        if "LastEvaluatedKey" not in response:
+            return items
+        params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+def list_bikes(query_params):
     try:
-        response = table.scan()
+        vehicle_type = query_params.get("type")
+        if vehicle_type:
+            # TypeIndex reads only the bikes of the requested type instead of the whole table
+            bikes = read_all(
+                table.query,
+                IndexName="TypeIndex",
+                KeyConditionExpression="#type = :type",
+                ExpressionAttributeValues={":type": vehicle_type},
+                **BIKE_PROJECTION
+            )
+        else:
+            bikes = read_all(table.scan, **BIKE_PROJECTION)
         logger.info("Listed all bikes successfully.")
-        return respond(200, response["Items"])
+        return respond(200, bikes)
     except Exception as e:
         logger.error(f"Error listing bikes: {str(e)}")
         return respond(500, {"error": str(e)})
@@ -72,66 +83,65 @@ def check_bike_availability(bike_id, query_params):
         if not start_date or not end_date:
             return respond(400, {"error": "Missing startDate or endDate parameters"})
         
-        # First check if the bike exists
-        bike_response = table.get_item(Key={"bikeId": bike_id})
-        if "Item" not in bike_response:
-            return respond(404, {"error": "Bike not found"})
-        
-        bike = bike_response["Item"]
-        
-        # Check for booking conflicts by querying the bookings table
-        # We need to import boto3.client for this
-        import boto3
-        dynamodb_client = boto3.client('dynamodb')
-        bookings_table = os.environ.get("BOOKINGS_TABLE", "DALScooterBookings")
-        
-        try:
-            # Query for conflicting bookings
-            conflict_query_params = {
-                'TableName': bookings_table,
-                'IndexName': 'BikeBookingsIndex',
-                'KeyConditionExpression': 'bikeId = :bikeId',
-                'FilterExpression': '#status = :status AND startDate <= :endDate AND endDate >= :startDate',
-                'ExpressionAttributeNames': {
-                    '#status': 'status'
-                },
-                'ExpressionAttributeValues': {
-                    ':bikeId': {'S': bike_id},
-                    ':status': {'S': 'active'},
-                    ':startDate': {'S': start_date},
-                    ':endDate': {'S': end_date}
-                }
+        # Query for conflicting bookings; only bookings starting on or before the
+        # requested end day can overlap, so bound the bookingDate range key
+        conflict_query_params = {
+            'IndexName': 'BikeBookingsIndex',
+            'KeyConditionExpression': 'bikeId = :bikeId AND bookingDate <= :endDay',
+            'FilterExpression': '#status = :status AND startDate <= :endDate AND endDate >= :startDate',
+            'ExpressionAttributeNames': {
+                '#status': 'status'
+            },
+            'ExpressionAttributeValues': {
+                ':bikeId': bike_id,
+                ':status': 'active',
+                ':startDate': start_date,
+                ':endDate': end_date,
+                ':endDay': end_date.split('T')[0]
             }
+        }
+        
+        # The bike lookup and the conflict query are independent, so issue them
+        # concurrently instead of paying for two sequential round trips
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            bike_future = executor.submit(table.get_item, Key={"bikeId": bike_id}, **BIKE_PROJECTION)
+            conflict_future = executor.submit(bookings_table.query, **conflict_query_params)
             
-            conflict_response = dynamodb_client.query(**conflict_query_params)
+            bike_response = bike_future.result()
+            if "Item" not in bike_response:
+                return respond(404, {"error": "Bike not found"})
             
-            if conflict_response.get('Items'):
-                # Bike is not available due to conflicting bookings
-                conflicting_booking = conflict_response['Items'][0]
-                return respond(200, {
-                    "available": False,
-                    "reason": "Bike is already booked for this time period",
-                    "bike": bike,
-                    "conflictingBooking": {
-                        "startDate": conflicting_booking['startDate']['S'],
-                        "endDate": conflicting_booking['endDate']['S']
-                    }
-                })
-            else:
-                # Bike is available for the requested time period
+            bike = bike_response["Item"]
+            
+            try:
+                conflict_response = conflict_future.result()
+            except Exception as e:
+                logger.error(f"Error checking booking conflicts: {str(e)}")
+                # If we can't check conflicts, assume bike is available
                 return respond(200, {
                     "available": True,
                     "bike": bike,
-                    "message": "Bike is available for the requested time period"
+                    "message": "Bike appears to be available (conflict check failed)"
                 })
-                
-        except Exception as e:
-            logger.error(f"Error checking booking conflicts: {str(e)}")
-            # If we can't check conflicts, assume bike is available
+        
+        if conflict_response.get('Items'):
+            # Bike is not available due to conflicting bookings
+            conflicting_booking = conflict_response['Items'][0]
+            return respond(200, {
+                "available": False,
+                "reason": "Bike is already booked for this time period",
+                "bike": bike,
+                "conflictingBooking": {
+                    "startDate": conflicting_booking['startDate'],
+                    "endDate": conflicting_booking['endDate']
+                }
+            })
+        else:
+            # Bike is available for the requested time period
             return respond(200, {
                 "available": True,
                 "bike": bike,
-                "message": "Bike appears to be available (conflict check failed)"
+                "message": "Bike is available for the requested time period"
             })
         
     except Exception as e:
@@ -147,14 +157,18 @@ def create_bike(body):
             "model": body.get("model"),
             "accessCode": body.get("accessCode"),
             "batteryLife": body.get("batteryLife"),
-            "hourlyRate": Decimal(str(body.get("hourlyRate", "0"))),
+            "hourlyRate": Decimal(body.get("hourlyRate", 0)),
             "discount": body.get("discount", ""),
             "features": body.get("features", []),
             "status": body.get("status", "available"),  # Default status to available
             "createdBy": body.get("createdBy"),
-            "createdAt": body.get("createdAt")
+            "createdAt": body.get("createdAt"),
+            # A new bike has no bookings yet, so an empty bookedUntil mark is exact and
+            # lets create_booking skip its conflict query from the first booking on
+            "bookedUntil": ""
         }
-        table.put_item(Item=item)
+        # Omit unset attributes; a NULL type would be rejected as the TypeIndex key
+        table.put_item(Item={k: v for k, v in item.items() if v is not None})
         logger.info(f"Created new bike: {bike_id}")
         return respond(201, {"message": "Bike added.", "bikeId": bike_id})
     except Exception as e:
@@ -166,29 +180,18 @@ def update_bike(bike_id, body):
         logger.warning("Missing bikeId for update request.")
         return respond(400, {"message": "Missing bikeId in path."})
     try:
-        update_expr = []
-        expr_attr_vals = {}
-        expr_attr_names = {}
-        for key, val in body.items():
-            if key == "bikeId":
-                continue
-            placeholder = f"#{key}" if key.lower() in ["type"] else key
-            update_expr.append(f"{placeholder} = :{key}")
-            if isinstance(val, float):
-                update_expr.append(f"{placeholder} = :{key}")
-            else:
-                expr_attr_vals[f":{key}"] = val
-            
-            if key.lower() in ["type"]:
-                expr_attr_names[f"#{key}"] = key
+        # Placeholder every attribute name, as update_booking does, so reserved
+        # words such as type and status never reach the expression unescaped
+        fields = {key: val for key, val in body.items() if key != "bikeId"}
+        if not fields:
+            return respond(400, {"message": "No fields to update."})
 
         update_params = {
             "Key": {"bikeId": bike_id},
-            "UpdateExpression": "SET " + ", ".join(update_expr),
-            "ExpressionAttributeValues": expr_attr_vals
+            "UpdateExpression": "SET " + ", ".join(f"#{key} = :{key}" for key in fields),
+            "ExpressionAttributeNames": {f"#{key}": key for key in fields},
+            "ExpressionAttributeValues": {f":{key}": val for key, val in fields.items()}
         }
-        if expr_attr_names:
-            update_params["ExpressionAttributeNames"] = expr_attr_names
         table.update_item(**update_params)
         logger.info(f"Updated bike: {bike_id}")
         return respond(200, {"message": "Bike updated."})
@@ -208,9 +211,17 @@ def delete_bike(bike_id):
         logger.error(f"Error deleting bike {bike_id}: {str(e)}")
         return respond(500, {"error": str(e)})
 
-def respond(status, body):
-    return {
-        "statusCode": status,
-        "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(body, cls=DecimalEncoder)
-    }
\ No newline at end of file
+def _bike_id(event):
+    return (event.get("pathParameters") or {}).get("bikeId")
+
+# API Gateway HTTP APIs pass the matched route as "METHOD /path/{param}",
+# so requests dispatch with a single dict lookup
+ROUTES = {
+    "GET /bikes": lambda event: list_bikes(event.get("queryStringParameters") or {}),
+    "GET /bikes/{bikeId}/availability": lambda event: check_bike_availability(
+        _bike_id(event), event.get("queryStringParameters") or {}
+    ),
+    "POST /bikes": lambda event: create_bike(parse_body(event)),
+    "PUT /bikes/{bikeId}": lambda event: update_bike(_bike_id(event), parse_body(event)),
+    "DELETE /bikes/{bikeId}": lambda event: delete_bike(_bike_id(event)),
+}
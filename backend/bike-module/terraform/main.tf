@@ -10,6 +10,18 @@ resource "aws_dynamodb_table" "bike_inventory" {
     type = "S"
   }
 
+  attribute {
+    name = "type"
+    type = "S"
+  }
+
+  # Global Secondary Index for listing bikes of one vehicle type
+  global_secondary_index {
+    name            = "TypeIndex"
+    hash_key        = "type"
+    projection_type = "ALL"
+  }
+
   tags = {
     Environment = "dev"
     Project     = "DALScooter"
@@ -22,6 +34,7 @@ resource "aws_lambda_function" "bike_crud_handler" {
   source_code_hash = data.archive_file.bike_crud.output_base64sha256
   handler       = "bike_crud_handler.lambda_handler"
   runtime       = "python3.11"
+  layers        = [var.common_layer_arn]
   role          = "arn:aws:iam::${data.aws_caller_identity.current.account_id}:role/LabRole"
   timeout       = 60
 
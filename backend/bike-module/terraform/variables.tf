@@ -8,4 +8,8 @@ variable "cognito_user_pool_id" {
 
 variable "cognito_user_pool_client_id" {
   type = string
-}
\ No newline at end of file
+}
+
+variable "common_layer_arn" {
+  type = string
+}
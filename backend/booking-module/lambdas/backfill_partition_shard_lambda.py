@@ -0,0 +1,46 @@
+import os
+import logging
+from common.aws import DDB_CLIENT
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+dynamodb = DDB_CLIENT
+bookings_table = os.environ['BOOKINGS_TABLE']
+
+def lambda_handler(event, context):
+    """
+    Give bookings written before AllBookingsIndex existed the partitionShard
+    attribute that index is keyed on, so they show up in the unfiltered admin
+    listing. Invoked by Terraform on deploy; items that already have the
+    attribute are left alone, so running it again is harmless
+    """
+    scan_params = {
+        'TableName': bookings_table,
+        'FilterExpression': 'attribute_not_exists(partitionShard)',
+        'ProjectionExpression': 'bookingId'
+    }
+    updated = 0
+    while True:
+        page = dynamodb.scan(**scan_params)
+        for item in page.get('Items', []):
+            try:
+                dynamodb.update_item(
+                    TableName=bookings_table,
+                    Key={'bookingId': item['bookingId']},
+                    UpdateExpression='SET partitionShard = :shard',
+                    # Skip bookings deleted since the scan instead of recreating them
+                    ConditionExpression='attribute_exists(bookingId)',
+                    ExpressionAttributeValues={':shard': {'S': 'ALL'}}
+                )
+                updated += 1
+            except dynamodb.exceptions.ConditionalCheckFailedException:
+                pass
+        if 'LastEvaluatedKey' not in page:
+            break
+        scan_params['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    logger.info(f"Backfilled partitionShard on {updated} bookings")
+    return {'updated': updated}
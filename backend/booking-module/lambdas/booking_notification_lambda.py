@@ -0,0 +1,40 @@
+import os
+import logging
+import boto3
+from common.aws import BOTO_CONFIG, unmarshal
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+sns = boto3.client('sns', config=BOTO_CONFIG)
+sns_topic_arn = os.environ['SNS_TOPIC_ARN']
+
+def lambda_handler(event, context):
+    """
+    Send the booking confirmation for bookings inserted into the bookings table
+    (DynamoDB Streams, NEW_IMAGE), off the create_booking request path
+    """
+    for record in event.get('Records', []):
+        if record.get('eventName') != 'INSERT':
+            continue
+        try:
+            booking = unmarshal(record['dynamodb']['NewImage'])
+            
+            sns.publish(
+                TopicArn=sns_topic_arn,
+                Subject="DALScooter Booking Confirmation",
+                Message=(
+                    f"Hello {booking['userEmail']},\n\n"
+                    f"Booking confirmed!\n\n"
+                    f"Booking ID: {booking['bookingId']}\n"
+                    f"Bike: {booking.get('bikeModel', 'Unknown')} ({booking.get('bikeType', 'Unknown')})\n"
+                    f"From: {booking['startDate']}\nTo: {booking['endDate']}\n\n"
+                    f"Thank you for choosing DALScooter!"
+                )
+            )
+            
+            logger.info(f"Booking confirmation sent for {booking['bookingId']}")
+            
+        except Exception as e:
+            logger.error(f"Error sending booking confirmation: {str(e)}", exc_info=True)
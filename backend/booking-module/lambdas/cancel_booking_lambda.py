@@ -1,16 +1,20 @@
-import json
-import boto3
 import os
 from datetime import datetime
 import logging
+from functools import partial
+from common.aws import DDB_CLIENT, SERIALIZER, cors_headers, parse_groups, respond, unmarshal
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
-dynamodb = boto3.client('dynamodb')
+dynamodb = DDB_CLIENT
 bookings_table = os.environ['BOOKINGS_TABLE']
+serializer = SERIALIZER
+
+_CORS_HEADERS = cors_headers('DELETE,OPTIONS')
+_resp = partial(respond, headers=_CORS_HEADERS)
 
 def lambda_handler(event, context):
     """
@@ -43,176 +47,60 @@ def lambda_handler(event, context):
             # Validate that we got a real user ID
             if user_id == 'unknown':
                 logger.error("Failed to extract user ID from JWT claims")
-                return {
-                    'statusCode': 401,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Invalid authentication token - user ID not found'
-                    })
-                }
+                return _resp(401, {'error': 'Invalid authentication token - user ID not found'})
                 
         except (KeyError, TypeError) as e:
             logger.error(f"Error extracting user claims: {str(e)}")
-            return {
-                'statusCode': 401,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Invalid authentication token'
-                })
-            }
+            return _resp(401, {'error': 'Invalid authentication token'})
         
         # Check if user is admin (BikeFranchise group)
-        is_admin = 'BikeFranchise' in user_groups
+        is_admin = 'BikeFranchise' in parse_groups(user_groups)
         
         # Get booking ID from path parameters
         path_params = event.get('pathParameters', {}) or {}
         booking_id = path_params.get('bookingId')
         
         if not booking_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Booking ID is required'
-                })
-            }
+            return _resp(400, {'error': 'Booking ID is required'})
         
-        # Get the existing booking
-        try:
-            booking_response = dynamodb.get_item(
-                TableName=bookings_table,
-                Key={'bookingId': {'S': booking_id}}
-            )
-            
-            if 'Item' not in booking_response:
-                return {
-                    'statusCode': 404,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Booking not found'
-                    })
-                }
-            
-            existing_booking = booking_response['Item']
-            
-            # Check if user owns this booking (unless admin)
-            if not is_admin and existing_booking['userId']['S'] != user_id:
-                return {
-                    'statusCode': 403,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'You can only cancel your own bookings'
-                    })
-                }
-            
-            # Check if booking can be cancelled
-            booking_status = existing_booking['status']['S']
-            if booking_status == 'cancelled':
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Booking is already cancelled'
-                    })
-                }
-            
-            if booking_status == 'completed':
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Cannot cancel a completed booking'
-                    })
-                }
-            
-            # Check if booking has already started
-            start_date = existing_booking['startDate']['S']
-            try:
-                start_datetime = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                # Use timezone-aware datetime.now() for comparison
-                current_time = datetime.now().replace(tzinfo=start_datetime.tzinfo)
-                if start_datetime < current_time:
-                    return {
-                        'statusCode': 400,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*',
-                            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                            'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                        },
-                        'body': json.dumps({
-                            'error': 'Cannot cancel a booking that has already started'
-                        })
-                    }
-            except ValueError:
-                logger.warning(f"Invalid start date format for booking {booking_id}")
-                
-        except Exception as e:
-            logger.error(f"Error retrieving booking: {str(e)}")
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Error retrieving booking'
-                })
-            }
+        # Read the clock once; it serves both the start check and the update timestamp
+        now = datetime.utcnow()
+        current_time = now.isoformat() + 'Z'
+        
+        # startDate is stored as a UTC ISO string with millisecond precision (as
+        # produced by the frontend), so the same format compares correctly as a string
+        start_cutoff = now.isoformat(timespec='milliseconds') + 'Z'
         
-        # Cancel the booking
-        current_time = datetime.utcnow().isoformat() + 'Z'
+        # A single conditional update replaces the read, the checks and the write:
+        # it only applies to an existing booking the caller may cancel that is not
+        # cancelled, completed or already started
+        condition_expression = (
+            'attribute_exists(bookingId) AND NOT #status IN (:cancelled, :completed) '
+            'AND startDate > :startCutoff'
+        )
+        expression_attribute_values = {
+            ':cancelled': serializer.serialize('cancelled'),
+            ':completed': serializer.serialize('completed'),
+            ':startCutoff': serializer.serialize(start_cutoff),
+            ':updatedAt': serializer.serialize(current_time)
+        }
+        if not is_admin:
+            condition_expression += ' AND userId = :userId'
+            expression_attribute_values[':userId'] = serializer.serialize(user_id)
         
         try:
-            dynamodb.update_item(
+            update_response = dynamodb.update_item(
                 TableName=bookings_table,
                 Key={'bookingId': {'S': booking_id}},
-                UpdateExpression="SET #status = :status, #updatedAt = :updatedAt",
+                UpdateExpression="SET #status = :cancelled, #updatedAt = :updatedAt",
+                ConditionExpression=condition_expression,
                 ExpressionAttributeNames={
                     '#status': 'status',
                     '#updatedAt': 'updatedAt'
                 },
-                ExpressionAttributeValues={
-                    ':status': {'S': 'cancelled'},
-                    ':updatedAt': {'S': current_time}
-                }
+                ExpressionAttributeValues=expression_attribute_values,
+                ReturnValues='ALL_NEW',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
             
             logger.info(f"Booking {booking_id} cancelled successfully")
@@ -220,62 +108,47 @@ def lambda_handler(event, context):
             # Note: We don't update bike status anymore since availability is checked dynamically
             # based on existing bookings rather than a simple status field
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                },
-                'body': json.dumps({
-                    'message': 'Booking cancelled successfully',
+            booking = unmarshal(update_response['Attributes'])
+            return _resp(200, {
+                'message': 'Booking cancelled successfully',
+                'bookingId': booking_id,
+                'cancelledAt': current_time,
+                'booking': {
                     'bookingId': booking_id,
-                    'cancelledAt': current_time,
-                    'booking': {
-                        'bookingId': booking_id,
-                        'userId': existing_booking['userId']['S'],
-                        'userEmail': existing_booking.get('userEmail', {}).get('S', ''),
-                        'bikeId': existing_booking['bikeId']['S'],
-                        'startDate': existing_booking['startDate']['S'],
-                        'endDate': existing_booking['endDate']['S'],
-                        'duration': int(existing_booking['duration']['N']),
-                        'status': 'cancelled',
-                        'notes': existing_booking.get('notes', {}).get('S', ''),
-                        'createdAt': existing_booking['createdAt']['S'],
-                        'updatedAt': current_time,
-                        'bikeModel': existing_booking.get('bikeModel', {}).get('S', 'Unknown'),
-                        'bikeType': existing_booking.get('bikeType', {}).get('S', 'Unknown')
-                    }
-                })
-            }
+                    'userId': booking['userId'],
+                    'userEmail': booking.get('userEmail', ''),
+                    'bikeId': booking['bikeId'],
+                    'startDate': booking['startDate'],
+                    'endDate': booking['endDate'],
+                    'duration': int(booking['duration']),
+                    'status': booking['status'],
+                    'notes': booking.get('notes', ''),
+                    'createdAt': booking['createdAt'],
+                    'updatedAt': booking['updatedAt'],
+                    'bikeModel': booking.get('bikeModel', 'Unknown'),
+                    'bikeType': booking.get('bikeType', 'Unknown')
+                }
+            })
+            
+        except dynamodb.exceptions.ConditionalCheckFailedException as e:
+            # The failed write hands back the current item, so report exactly which
+            # rule rejected the cancellation without reading the booking again
+            if 'Item' not in e.response:
+                return _resp(404, {'error': 'Booking not found'})
+            
+            existing_booking = unmarshal(e.response['Item'])
+            if not is_admin and existing_booking['userId'] != user_id:
+                return _resp(403, {'error': 'You can only cancel your own bookings'})
+            if existing_booking['status'] == 'cancelled':
+                return _resp(400, {'error': 'Booking is already cancelled'})
+            if existing_booking['status'] == 'completed':
+                return _resp(400, {'error': 'Cannot cancel a completed booking'})
+            return _resp(400, {'error': 'Cannot cancel a booking that has already started'})
             
         except Exception as e:
             logger.error(f"Error cancelling booking: {str(e)}")
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Error cancelling booking'
-                })
-            }
+            return _resp(500, {'error': 'Error cancelling booking'})
             
     except Exception as e:
         logger.error(f"Unexpected error in cancel_booking_lambda: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                'Access-Control-Allow-Methods': 'DELETE,OPTIONS'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error'
-            })
-        } 
\ No newline at end of file
+        return _resp(500, {'error': 'Internal server error'}) 
\ No newline at end of file
@@ -1,391 +1,371 @@
 import json
 import boto3
 import os
+import time
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 import logging
+from decimal import Decimal
+from functools import partial
+from common.aws import BOTO_CONFIG, DDB_CLIENT, JSON_ENCODER, SERIALIZER, cors_headers, get_claims, parse_body, respond
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
-dynamodb = boto3.client('dynamodb')
+dynamodb = DDB_CLIENT
 bookings_table = os.environ['BOOKINGS_TABLE']
 bike_inventory_table = os.environ['BIKE_INVENTORY_TABLE']
-sns = boto3.client("sns")
+serializer = SERIALIZER
+sns = boto3.client("sns", config=BOTO_CONFIG)
 sns_topic_arn = os.environ["SNS_TOPIC_ARN"]
 
+# Make one cheap call during init so credential loading, endpoint resolution
+# and the TLS handshake happen before the first booking request, not inside it
+try:
+    dynamodb.describe_endpoints()
+except Exception as e:
+    logger.warning("DynamoDB warm-up call failed: %s", e)
+
+_CORS_HEADERS = cors_headers('POST,OPTIONS')
+_resp = partial(respond, headers=_CORS_HEADERS)
+
+# Bike rows read by earlier invocations in this container: bikeId -> (expiry, item).
+# Only bookable bikes are cached, and the booking transaction re-checks the row, so
+# a stale entry can cost a retry but never a wrong booking
+_BIKE_CACHE = {}
+_BIKE_CACHE_TTL = 30  # seconds
+
+def _get_bike(bike_id):
+    """
+    Return (bike item, whether it came from the cache); the item is None if the
+    bike does not exist
+    """
+    entry = _BIKE_CACHE.get(bike_id)
+    if entry and entry[0] > time.monotonic():
+        return entry[1], True
+    
+    # Only read what the booking needs: availability, lock state and the
+    # model/type copied onto the booking record
+    bike_response = dynamodb.get_item(
+        TableName=bike_inventory_table,
+        Key={'bikeId': {'S': bike_id}},
+        ProjectionExpression='bikeId, #status, model, #type, bookingVersion, bookedUntil',
+        ExpressionAttributeNames={'#status': 'status', '#type': 'type'}
+    )
+    bike_data = bike_response.get('Item')
+    if bike_data and bike_data.get('status', {}).get('S', 'available') == 'available':
+        _BIKE_CACHE[bike_id] = (time.monotonic() + _BIKE_CACHE_TTL, bike_data)
+    else:
+        _BIKE_CACHE.pop(bike_id, None)
+    return bike_data, False
+
+_REQUIRED_FIELDS = ('bikeId', 'startDate', 'endDate', 'duration')
+_REQUIRED_FIELD_SET = frozenset(_REQUIRED_FIELDS)
+
+# The success body always has the same shape, so it is filled in from a template
+# instead of walking a dict through the encoder; _quote JSON-escapes a string and
+# wraps it in quotes
+_quote = json.encoder.encode_basestring_ascii
+_SUCCESS_TMPL = (
+    '{{"message":"Booking created successfully","bookingId":{bookingId},'
+    '"booking":{{"bookingId":{bookingId},"userId":{userId},"userEmail":{userEmail},'
+    '"bikeId":{bikeId},"startDate":{startDate},"endDate":{endDate},"duration":{duration},'
+    '"status":"active","notes":{notes},"createdAt":{createdAt},'
+    '"bikeModel":{bikeModel},"bikeType":{bikeType}}}}}'
+)
+
 def lambda_handler(event, context):
     """
     Create a new booking for an e-scooter
     """
     try:
-        # Debug logging
-        logger.info(f"Event structure: {json.dumps(event, default=str)}")
+        # Answer CORS preflight straight away; it carries no body or token to check
+        if event.get('requestContext', {}).get('http', {}).get('method') == 'OPTIONS' or event.get('httpMethod') == 'OPTIONS':
+            return {'statusCode': 204, 'headers': _CORS_HEADERS, 'body': ''}
+        
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Event structure: %s", json.dumps(event, default=str))
         
         # Parse the request
         if event.get('body'):
-            body = json.loads(event['body'])
+            body = parse_body(event)
         else:
             body = event
         
         # Extract user info from Cognito claims
         try:
-            # Debug the authorizer structure
-            logger.info(f"Authorizer structure: {json.dumps(event.get('requestContext', {}).get('authorizer', {}), default=str)}")
-            
-            authorizer = event.get('requestContext', {}).get('authorizer', {})
-            
-            # For API Gateway v2 with JWT authorizer, claims are directly in the authorizer
-            # The structure is: authorizer.jwt.claims
-            if 'jwt' in authorizer and 'claims' in authorizer['jwt']:
-                claims = authorizer['jwt']['claims']
-                user_id = claims.get('sub', 'unknown')
-                user_email = claims.get('email', 'unknown@example.com')
-                logger.info(f"Extracted from jwt.claims - user_id: {user_id}, user_email: {user_email}")
-            elif 'claims' in authorizer:
-                # Fallback for different authorizer structure
-                claims = authorizer['claims']
-                user_id = claims.get('sub', 'unknown')
-                user_email = claims.get('email', 'unknown@example.com')
-                logger.info(f"Extracted from claims - user_id: {user_id}, user_email: {user_email}")
-            else:
-                # Last resort: try to extract from authorizer directly
-                user_id = authorizer.get('sub', 'unknown')
-                user_email = authorizer.get('email', 'unknown@example.com')
-                logger.info(f"Extracted from authorizer directly - user_id: {user_id}, user_email: {user_email}")
+            claims = get_claims(event)
+            user_id = claims.get('sub', 'unknown')
+            user_email = claims.get('email', 'unknown@example.com')
+            if debug:
+                logger.debug("Claims: %s", json.dumps(claims, default=str))
                 
             # Validate that we got a real user ID
             if user_id == 'unknown':
                 logger.error("Failed to extract user ID from JWT claims")
-                return {
-                    'statusCode': 401,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Invalid authentication token - user ID not found'
-                    })
-                }
+                return _resp(401, {'error': 'Invalid authentication token - user ID not found'})
                 
-        except (KeyError, TypeError) as e:
-            logger.error(f"Error extracting user claims: {str(e)}")
-            return {
-                'statusCode': 401,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Invalid authentication token'
-                })
-            }
+        except (KeyError, TypeError):
+            logger.exception("Error extracting user claims")
+            return _resp(401, {'error': 'Invalid authentication token'})
         
-        # Validate required fields
-        required_fields = ['bikeId', 'startDate', 'endDate', 'duration']
-        for field in required_fields:
-            if field not in body:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': f'Missing required field: {field}'
-                    })
-                }
+        # The set test needs a JSON object; an array or scalar body is a bad request
+        if not isinstance(body, dict):
+            return _resp(400, {'error': 'Request body must be a JSON object'})
+        
+        # Validate required fields; the error names the first missing one in field order
+        if not _REQUIRED_FIELD_SET.issubset(body.keys()):
+            missing = next(field for field in _REQUIRED_FIELDS if field not in body)
+            return _resp(400, {'error': f'Missing required field: {missing}'})
         
         bike_id = body['bikeId']
         start_date = body['startDate']
         end_date = body['endDate']
         duration = body['duration']
-        notes = body.get('notes', '')
+        notes = body.get('notes') or ''
+        
+        # notes is echoed through the string-only _quote, so anything else is
+        # rejected here rather than after the booking is written
+        if not isinstance(notes, str):
+            return _resp(400, {'error': 'notes must be a string'})
         
-        # Validate dates
+        # Validate dates; Python 3.11's fromisoformat accepts the trailing 'Z' itself
         try:
-            start_datetime = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            end_datetime = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            start_datetime = datetime.fromisoformat(start_date)
+            end_datetime = datetime.fromisoformat(end_date)
+            
+            # Without an offset the dates cannot be compared with the UTC clock
+            if start_datetime.tzinfo is None or end_datetime.tzinfo is None:
+                return _resp(400, {'error': 'Start and end dates must include a timezone offset'})
             
             if start_datetime >= end_datetime:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Start date must be before end date'
-                    })
-                }
+                return _resp(400, {'error': 'Start date must be before end date'})
             
-            # Use timezone-aware datetime.now() for comparison
-            current_time = datetime.now().replace(tzinfo=start_datetime.tzinfo)
-            if start_datetime < current_time:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Start date cannot be in the past'
-                    })
-                }
+            # Read the UTC clock once; the same instant is reused for the booking's
+            # timestamps
+            now = datetime.now(timezone.utc)
+            if start_datetime < now:
+                return _resp(400, {'error': 'Start date cannot be in the past'})
                 
         except ValueError as e:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': f'Invalid date format: {str(e)}'
-                })
-            }
+            return _resp(400, {'error': f'Invalid date format: {str(e)}'})
         
-        # Check if bike exists
-        try:
-            bike_response = dynamodb.get_item(
-                TableName=bike_inventory_table,
-                Key={'bikeId': {'S': bike_id}}
-            )
+        # The bike row may come from this container's cache; a stale copy only shows
+        # up as a failed lock, which is retried once with a fresh read
+        for attempt in range(2):
+            # Check if bike exists
+            try:
+                bike_data, bike_from_cache = _get_bike(bike_id)
             
-            if 'Item' not in bike_response:
-                return {
-                    'statusCode': 404,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Bike not found'
-                    })
-                }
+                if bike_data is None:
+                    return _resp(404, {'error': 'Bike not found'})
             
-            bike_data = bike_response['Item']
-            
-            # Check if bike is available
-            if bike_data.get('status', {}).get('S', 'available') != 'available':
-                return {
-                    'statusCode': 409,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': f'Bike is currently {bike_data.get("status", {}).get("S", "unavailable")}'
-                    })
-                }
+                # Check if bike is available
+                if bike_data.get('status', {}).get('S', 'available') != 'available':
+                    return _resp(409, {'error': f'Bike is currently {bike_data.get("status", {}).get("S", "unavailable")}'})
                 
-        except Exception as e:
-            logger.error(f"Error checking bike: {str(e)}")
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Error checking bike'
-                })
-            }
+            except Exception:
+                logger.exception("Error checking bike")
+                return _resp(500, {'error': 'Error checking bike'})
         
-        # Check for booking conflicts (overlapping time periods)
-        try:
-            # Query existing bookings for this bike that overlap with the requested time period
-            # We need to check for any active bookings that overlap
-            conflict_query_params = {
-                'TableName': bookings_table,
-                'IndexName': 'BikeBookingsIndex',
-                'KeyConditionExpression': 'bikeId = :bikeId',
-                'FilterExpression': '#status = :status AND startDate <= :endDate AND endDate >= :startDate',
-                'ExpressionAttributeNames': {
-                    '#status': 'status'
-                },
-                'ExpressionAttributeValues': {
-                    ':bikeId': {'S': bike_id},
-                    ':status': {'S': 'active'},
-                    ':startDate': {'S': start_date},
-                    ':endDate': {'S': end_date}
-                }
-            }
+            # Bookings for this bike never run past its bookedUntil mark (every booking
+            # raises it, cancellations just leave it conservatively high), so a request
+            # starting after it cannot overlap anything and skips the conflict query
+            booked_until = bike_data.get('bookedUntil', {}).get('S')
+            if booked_until is None or start_date <= booked_until:
+                # Check for booking conflicts (overlapping time periods)
+                try:
+                    # Query existing bookings for this bike that overlap with the requested time period
+                    # We need to check for any active bookings that overlap. Only bookings starting
+                    # on or before the requested end day can overlap, so bound the bookingDate range key
+                    conflict_query_params = {
+                        'TableName': bookings_table,
+                        'IndexName': 'BikeBookingsIndex',
+                        'KeyConditionExpression': 'bikeId = :bikeId AND bookingDate <= :endDay',
+                        'FilterExpression': '#status = :status AND startDate <= :endDate AND endDate >= :startDate',
+                        'ExpressionAttributeNames': {
+                            '#status': 'status'
+                        },
+                        'ExpressionAttributeValues': {
+                            ':bikeId': {'S': bike_id},
+                            ':status': {'S': 'active'},
+                            ':startDate': {'S': start_date},
+                            ':endDate': {'S': end_date},
+                            ':endDay': {'S': end_datetime.date().isoformat()}
+                        }
+                    }
             
-            conflict_response = dynamodb.query(**conflict_query_params)
+                    conflict_response = dynamodb.query(**conflict_query_params)
             
-            if conflict_response.get('Items'):
-                conflicting_booking = conflict_response['Items'][0]
-                return {
-                    'statusCode': 409,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Bike is already booked for this time period',
-                        'conflictingBooking': {
-                            'startDate': conflicting_booking['startDate']['S'],
-                            'endDate': conflicting_booking['endDate']['S']
-                        }
-                    })
-                }
+                    if conflict_response.get('Items'):
+                        conflicting_booking = conflict_response['Items'][0]
+                        return _resp(409, {
+                            'error': 'Bike is already booked for this time period',
+                            'conflictingBooking': {
+                                'startDate': conflicting_booking['startDate']['S'],
+                                'endDate': conflicting_booking['endDate']['S']
+                            }
+                        })
                 
-        except Exception as e:
-            logger.error(f"Error checking booking conflicts: {str(e)}")
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Error checking booking availability'
-                })
-            }
+                except Exception:
+                    logger.exception("Error checking booking conflicts")
+                    return _resp(500, {'error': 'Error checking booking availability'})
         
 
         
-        # Create booking
-        booking_id = str(uuid.uuid4())
-        current_time = datetime.now().replace(tzinfo=start_datetime.tzinfo).isoformat()
+            # Create booking
+            booking_id = str(uuid.uuid4())
+            current_time = now.isoformat()
         
-        booking_item = {
-            'bookingId': {'S': booking_id},
-            'userId': {'S': user_id},
-            'userEmail': {'S': user_email},
-            'bikeId': {'S': bike_id},
-            'startDate': {'S': start_date},
-            'endDate': {'S': end_date},
-            'duration': {'N': str(duration)},
-            'status': {'S': 'active'},
-            'notes': {'S': notes},
-            'createdAt': {'S': current_time},
-            'updatedAt': {'S': current_time},
-            'bookingDate': {'S': start_date.split('T')[0]}  # For GSI
-        }
+            booking = {
+                'bookingId': booking_id,
+                'userId': user_id,
+                'userEmail': user_email,
+                'bikeId': bike_id,
+                'startDate': start_date,
+                'endDate': end_date,
+                'duration': Decimal(str(duration)),
+                'status': 'active',
+                'notes': notes,
+                'createdAt': current_time,
+                'updatedAt': current_time,
+                'bookingDate': start_datetime.date().isoformat(),  # For GSI; same day as the string's date part
+                'partitionShard': 'ALL',  # Hash key of AllBookingsIndex (admin listing)
+                # Bike details copied onto the booking
+                'bikeModel': bike_data.get('model', {'S': 'Unknown'})['S'],
+                'bikeType': bike_data.get('type', {'S': 'Unknown'})['S']
+            }
+            booking_item = {key: serializer.serialize(value) for key, value in booking.items()}
         
-        # Add bike details to booking
-        booking_item['bikeModel'] = bike_data.get('model', {'S': 'Unknown'})
-        booking_item['bikeType'] = bike_data.get('type', {'S': 'Unknown'})
+            # Optimistic lock on the bike row: every booking (and every booking
+            # extension) bumps bookingVersion, so the write only goes through if no
+            # other booking for this bike has committed since the bike was read and
+            # the conflict check ran
+            bike_version = bike_data.get('bookingVersion', {}).get('N')
+            lock_condition = 'bookingVersion = :version' if bike_version else 'attribute_not_exists(bookingVersion)'
+            lock_update = 'SET bookingVersion = if_not_exists(bookingVersion, :zero) + :one'
+            lock_values = {
+                ':available': {'S': 'available'},
+                ':zero': {'N': '0'},
+                ':one': {'N': '1'}
+            }
+            if bike_version:
+                lock_values[':version'] = {'N': bike_version}
+            # Only a bike that already has a mark gets it raised; one set from this
+            # booking alone would hide older bookings that end later
+            if booked_until is not None:
+                lock_update += ', bookedUntil = :bookedUntil'
+                lock_values[':bookedUntil'] = {'S': max(booked_until, end_date)}
         
-        try:
-            dynamodb.put_item(
-                TableName=bookings_table,
-                Item=booking_item
-            )
+            try:
+                # Write the booking and bump the bike's lock in one transaction; the bike
+                # stays available for other time periods, so its status is not flipped
+                dynamodb.transact_write_items(
+                    TransactItems=[
+                        {
+                            'Update': {
+                                'TableName': bike_inventory_table,
+                                'Key': {'bikeId': {'S': bike_id}},
+                                'UpdateExpression': lock_update,
+                                'ConditionExpression': (
+                                    'attribute_exists(bikeId) AND (attribute_not_exists(#status) OR #status = :available) '
+                                    f'AND {lock_condition}'
+                                ),
+                                'ExpressionAttributeNames': {'#status': 'status'},
+                                'ExpressionAttributeValues': lock_values,
+                                'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+                            }
+                        },
+                        {
+                            'Put': {
+                                'TableName': bookings_table,
+                                'Item': booking_item,
+                                'ConditionExpression': 'attribute_not_exists(bookingId)'
+                            }
+                        }
+                    ]
+                )
+            
+                logger.info(f"Booking created successfully: {booking_id}")
             
-            logger.info(f"Booking created successfully: {booking_id}")
+                # This container now knows the bike's lock state exactly
+                cached_bike = {**bike_data, 'bookingVersion': {'N': str(int(bike_version or 0) + 1)}}
+                if booked_until is not None:
+                    cached_bike['bookedUntil'] = lock_values[':bookedUntil']
+                _BIKE_CACHE[bike_id] = (time.monotonic() + _BIKE_CACHE_TTL, cached_bike)
 
-            # Note: We don't update bike status to "unavailable" here
-            # The bike remains available for other time periods
-            # Availability is checked dynamically based on existing bookings
+                # Note: We don't update bike status to "unavailable" here
+                # The bike remains available for other time periods
+                # Availability is checked dynamically based on existing bookings
 
-            # Publish booking confirmation to SNS
-            sns.publish(
-                TopicArn=sns_topic_arn,
-                Subject="DALScooter Booking Confirmation",
-                Message=(
-                    f"Hello {user_email},\n\n"
-                    f"Booking confirmed!\n\n"
-                    f"Booking ID: {booking_id}\n"
-                    f"Bike: {bike_data.get('model', {'S': 'Unknown'})['S']} ({bike_data.get('type', {'S': 'Unknown'})['S']})\n"
-                    f"From: {start_date}\nTo: {end_date}\n\n"
-                    f"Thank you for choosing DALScooter!"
-                )
-            )
+                # The confirmation email is sent by booking_notification_lambda from
+                # the table's stream, so the user does not wait on SNS here
             
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                },
-                'body': json.dumps({
-                    'message': 'Booking created successfully',
-                    'bookingId': booking_id,
-                    'booking': {
-                        'bookingId': booking_id,
-                        'userId': user_id,
-                        'userEmail': user_email,
-                        'bikeId': bike_id,
-                        'startDate': start_date,
-                        'endDate': end_date,
-                        'duration': duration,
-                        'status': 'active',
-                        'notes': notes,
-                        'createdAt': current_time,
-                        'bikeModel': booking_item['bikeModel']['S'],
-                        'bikeType': booking_item['bikeType']['S']
-                    }
-                })
-            }
+                return {
+                    'statusCode': 201,
+                    'headers': _CORS_HEADERS,
+                    'body': _SUCCESS_TMPL.format(
+                        bookingId=_quote(booking_id),
+                        userId=_quote(user_id),
+                        userEmail=_quote(user_email),
+                        bikeId=_quote(bike_id),
+                        startDate=_quote(start_date),
+                        endDate=_quote(end_date),
+                        duration=JSON_ENCODER.encode(duration),
+                        notes=_quote(notes),
+                        createdAt=_quote(current_time),
+                        bikeModel=_quote(booking['bikeModel']),
+                        bikeType=_quote(booking['bikeType'])
+                    )
+                }
+            
+            except dynamodb.exceptions.TransactionCanceledException as e:
+                # Reasons are reported in TransactItems order: bike lock first, then the put.
+                # A failed bike condition hands back the current bike row, so the caller
+                # can be told why without reading the bike again
+                reasons = e.response.get('CancellationReasons', [])
+                logger.warning("Booking transaction cancelled for bike %s: %s", bike_id, [reason.get('Code') for reason in reasons])
+                bike_reason = reasons[0] if reasons else {}
+                if bike_reason.get('Code') == 'ConditionalCheckFailed':
+                    current_bike = bike_reason.get('Item')
+                    if not current_bike:
+                        _BIKE_CACHE.pop(bike_id, None)
+                        return _resp(404, {'error': 'Bike not found'})
+                    bike_status = current_bike.get('status', {}).get('S', 'available')
+                    if bike_status != 'available':
+                        _BIKE_CACHE.pop(bike_id, None)
+                        return _resp(409, {'error': f'Bike is currently {bike_status}'})
+                    # Still available, so another booking for the bike committed first.
+                    # If that was only news to this container's cached copy, read the
+                    # bike again and retry once
+                    _BIKE_CACHE.pop(bike_id, None)
+                    if bike_from_cache and attempt == 0:
+                        continue
+                    error_message = 'Bike is no longer available for this time period, please try again'
+                else:
+                    error_message = 'Booking could not be created, please try again'
+                return _resp(409, {'error': error_message})
             
-        except Exception as e:
-            logger.error(f"Error creating booking: {str(e)}")
+            except Exception:
+                logger.exception("Error creating booking")
 
-            sns.publish(
-                TopicArn=sns_topic_arn,
-                Subject="DALScooter Booking Failed",
-                Message=(
-                    f"Hello {user_email},\n\n"
-                    f"Unfortunately, your booking attempt failed.\n\n"
-                    f"Booking details:\nBike ID: {bike_id}\n"
-                    f"Start: {start_date}, End: {end_date}\n\n"
-                    f"Please try again or contact support if the issue persists."
+                sns.publish(
+                    TopicArn=sns_topic_arn,
+                    Subject="DALScooter Booking Failed",
+                    Message=(
+                        f"Hello {user_email},\n\n"
+                        f"Unfortunately, your booking attempt failed.\n\n"
+                        f"Booking details:\nBike ID: {bike_id}\n"
+                        f"Start: {start_date}, End: {end_date}\n\n"
+                        f"Please try again or contact support if the issue persists."
+                    )
                 )
-            )
 
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'POST,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Error creating booking'
-                })
-            }
+                return _resp(500, {'error': 'Error creating booking'})
             
-    except Exception as e:
-        logger.error(f"Unexpected error in create_booking_lambda: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                'Access-Control-Allow-Methods': 'POST,OPTIONS'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error'
-            })
-        } 
\ No newline at end of file
+    except Exception:
+        logger.exception("Unexpected error in create_booking_lambda")
+        return _resp(500, {'error': 'Internal server error'}) 
\ No newline at end of file
@@ -1,17 +1,53 @@
-import json
-import boto3
 import os
-from datetime import datetime
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 import logging
+from functools import partial
+from common.aws import BOOKING_PROJECTION, BOOKING_PROJECTION_NAMES, DDB_CLIENT, cors_headers, parse_groups, respond, unmarshal
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
-dynamodb = boto3.client('dynamodb')
+dynamodb = DDB_CLIENT
 bookings_table = os.environ['BOOKINGS_TABLE']
 
+_CORS_HEADERS = cors_headers('GET,OPTIONS')
+_resp = partial(respond, headers=_CORS_HEADERS)
+
+# Booking items read by earlier invocations in this container, least recently used
+# first: bookingId -> (read at, item). Updates and cancellations run in other
+# Lambdas, so an entry may trail them by up to the TTL
+_BOOKING_CACHE = OrderedDict()
+_CACHE_TTL = 30  # seconds
+_CACHE_MAX = 512
+
+def _cached_get_booking(booking_id):
+    """Return the raw booking item, or None if the booking does not exist"""
+    now = time.monotonic()
+    entry = _BOOKING_CACHE.get(booking_id)
+    if entry and now - entry[0] < _CACHE_TTL:
+        _BOOKING_CACHE.move_to_end(booking_id)
+        return entry[1]
+    
+    item = dynamodb.get_item(
+        TableName=bookings_table,
+        Key={'bookingId': {'S': booking_id}},
+        ProjectionExpression=BOOKING_PROJECTION,
+        ExpressionAttributeNames=BOOKING_PROJECTION_NAMES
+    ).get('Item')
+    if item is None:
+        _BOOKING_CACHE.pop(booking_id, None)
+        return None
+    
+    _BOOKING_CACHE[booking_id] = (now, item)
+    _BOOKING_CACHE.move_to_end(booking_id)
+    if len(_BOOKING_CACHE) > _CACHE_MAX:
+        _BOOKING_CACHE.popitem(last=False)
+    return item
+
 def lambda_handler(event, context):
     """
     Get detailed information about a specific booking
@@ -43,124 +79,62 @@ def lambda_handler(event, context):
             # Validate that we got a real user ID
             if user_id == 'unknown':
                 logger.error("Failed to extract user ID from JWT claims")
-                return {
-                    'statusCode': 401,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Invalid authentication token - user ID not found'
-                    })
-                }
+                return _resp(401, {'error': 'Invalid authentication token - user ID not found'})
                 
         except (KeyError, TypeError) as e:
             logger.error(f"Error extracting user claims: {str(e)}")
-            return {
-                'statusCode': 401,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Invalid authentication token'
-                })
-            }
+            return _resp(401, {'error': 'Invalid authentication token'})
         
         # Check if user is admin (BikeFranchise group)
-        is_admin = 'BikeFranchise' in user_groups
+        is_admin = 'BikeFranchise' in parse_groups(user_groups)
         
         # Get booking ID from path parameters
         path_params = event.get('pathParameters', {}) or {}
         booking_id = path_params.get('bookingId')
         
         if not booking_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Booking ID is required'
-                })
-            }
+            return _resp(400, {'error': 'Booking ID is required'})
         
         # Get the booking details
         try:
-            booking_response = dynamodb.get_item(
-                TableName=bookings_table,
-                Key={'bookingId': {'S': booking_id}}
-            )
+            booking_item = _cached_get_booking(booking_id)
             
-            if 'Item' not in booking_response:
-                return {
-                    'statusCode': 404,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Booking not found'
-                    })
-                }
+            if booking_item is None:
+                return _resp(404, {'error': 'Booking not found'})
             
-            booking_item = booking_response['Item']
-            
-            # Check if user owns this booking (unless admin)
+            # Check if user owns this booking (unless admin) on the raw item, so a
+            # 403 returns before any unmarshalling or date math
             if not is_admin and booking_item['userId']['S'] != user_id:
-                return {
-                    'statusCode': 403,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'You can only view your own bookings'
-                    })
-                }
+                return _resp(403, {'error': 'You can only view your own bookings'})
             
             # Format the booking details
+            item = unmarshal(booking_item)
             booking = {
-                'bookingId': booking_item['bookingId']['S'],
-                'userId': booking_item['userId']['S'],
-                'userEmail': booking_item.get('userEmail', {}).get('S', ''),
-                'bikeId': booking_item['bikeId']['S'],
-                'startDate': booking_item['startDate']['S'],
-                'endDate': booking_item['endDate']['S'],
-                'duration': int(booking_item['duration']['N']),
-                'status': booking_item['status']['S'],
-                'notes': booking_item.get('notes', {}).get('S', ''),
-                'createdAt': booking_item['createdAt']['S'],
-                'updatedAt': booking_item.get('updatedAt', {}).get('S', ''),
-                'bikeModel': booking_item.get('bikeModel', {}).get('S', 'Unknown'),
-                'bikeType': booking_item.get('bikeType', {}).get('S', 'Unknown')
+                'bookingId': item['bookingId'],
+                'userId': item['userId'],
+                'userEmail': item.get('userEmail', ''),
+                'bikeId': item['bikeId'],
+                'startDate': item['startDate'],
+                'endDate': item['endDate'],
+                'duration': int(item['duration']),
+                'status': item['status'],
+                'notes': item.get('notes', ''),
+                'createdAt': item['createdAt'],
+                'updatedAt': item.get('updatedAt', ''),
+                'bikeModel': item.get('bikeModel', 'Unknown'),
+                'bikeType': item.get('bikeType', 'Unknown')
             }
             
-            # Add additional calculated fields
+            # Add additional calculated fields. Python 3.11's fromisoformat accepts the
+            # trailing 'Z' itself, and one UTC clock reading serves every comparison
             try:
-                start_datetime = datetime.fromisoformat(booking['startDate'].replace('Z', '+00:00'))
-                end_datetime = datetime.fromisoformat(booking['endDate'].replace('Z', '+00:00'))
-                current_time = datetime.now().replace(tzinfo=start_datetime.tzinfo)
+                start_datetime = datetime.fromisoformat(booking['startDate'])
+                end_datetime = datetime.fromisoformat(booking['endDate'])
+                current_time = datetime.now(timezone.utc)
                 
-                # Calculate time until booking starts
+                # Calculate seconds until booking starts; the client formats durations
                 if start_datetime > current_time:
-                    time_until_start = start_datetime - current_time
-                    booking['timeUntilStart'] = {
-                        'days': time_until_start.days,
-                        'hours': time_until_start.seconds // 3600,
-                        'minutes': (time_until_start.seconds % 3600) // 60
-                    }
+                    booking['timeUntilStart'] = int((start_datetime - current_time).total_seconds())
                 else:
                     booking['timeUntilStart'] = None
                 
@@ -172,17 +146,15 @@ def lambda_handler(event, context):
                 else:
                     booking['bookingState'] = 'past'
                 
-                # Calculate remaining time for active bookings
+                # Calculate remaining seconds for active bookings
                 if booking['bookingState'] == 'active':
-                    remaining_time = end_datetime - current_time
-                    booking['remainingTime'] = {
-                        'hours': remaining_time.seconds // 3600,
-                        'minutes': (remaining_time.seconds % 3600) // 60
-                    }
+                    booking['remainingTime'] = int((end_datetime - current_time).total_seconds())
                 else:
                     booking['remainingTime'] = None
                     
-            except ValueError as e:
+            except (ValueError, TypeError) as e:
+                # TypeError covers dates stored without an offset, which cannot be
+                # compared with the UTC clock
                 logger.warning(f"Error calculating time fields for booking {booking_id}: {str(e)}")
                 booking['timeUntilStart'] = None
                 booking['bookingState'] = 'unknown'
@@ -190,47 +162,16 @@ def lambda_handler(event, context):
             
             logger.info(f"Retrieved booking details for {booking_id}")
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                },
-                'body': json.dumps({
-                    'booking': booking,
-                    'userEmail': user_email,
-                    'isAdmin': is_admin
-                })
-            }
+            return _resp(200, {
+                'booking': booking,
+                'userEmail': user_email,
+                'isAdmin': is_admin
+            })
             
         except Exception as e:
             logger.error(f"Error retrieving booking details: {str(e)}")
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Error retrieving booking details'
-                })
-            }
+            return _resp(500, {'error': 'Error retrieving booking details'})
             
     except Exception as e:
         logger.error(f"Unexpected error in get_booking_details_lambda: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error'
-            })
-        } 
\ No newline at end of file
+        return _resp(500, {'error': 'Internal server error'}) 
\ No newline at end of file
@@ -1,17 +1,73 @@
+import base64
 import json
-import boto3
 import os
-from datetime import datetime
 import logging
+from functools import partial
+from common.aws import BOOKING_PROJECTION, BOOKING_PROJECTION_NAMES, DDB_CLIENT, cors_headers, get_claims, parse_groups, respond, unmarshal
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
-dynamodb = boto3.client('dynamodb')
+dynamodb = DDB_CLIENT
 bookings_table = os.environ['BOOKINGS_TABLE']
 
+_CORS_HEADERS = cors_headers('GET,OPTIONS')
+_resp = partial(respond, headers=_CORS_HEADERS)
+
+def read_page(read, params, limit):
+    """
+    Make one DynamoDB query/scan call that evaluates at most `limit` items, so a
+    request costs one bounded round trip however selective its FilterExpression
+    is. The page can therefore hold fewer than `limit` matches (even none) while
+    more remain. Returns the items and the key to resume from, or None when
+    nothing is left.
+    """
+    page = read(Limit=limit, **params)
+    return page.get('Items', []), page.get('LastEvaluatedKey')
+
+def encode_cursor(key):
+    """
+    Turn a page's LastEvaluatedKey into an opaque, URL-safe cursor. Every item of
+    the page is returned, never trimmed, so the next page starts right after it
+    """
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode() if key else None
+
+def decode_cursor(cursor, partition_key, partition_value, sort_key, sort_prefix=''):
+    """
+    Turn a cursor back into an ExclusiveStartKey for the index being queried.
+    Raises ValueError unless it is a string key of that index (plus the table's
+    bookingId) inside the partition and sort key range the query reads
+    """
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(key, dict) or set(key) != {'bookingId', partition_key, sort_key}:
+        raise ValueError('cursor is not a key of this index')
+    values = {name: attr.get('S') if isinstance(attr, dict) and len(attr) == 1 else None for name, attr in key.items()}
+    if not all(isinstance(value, str) for value in values.values()):
+        raise ValueError('cursor key values must be strings')
+    if values[partition_key] != partition_value or not values[sort_key].startswith(sort_prefix):
+        raise ValueError('cursor is outside this query')
+    return key
+
+def _format_booking(booking):
+    """Shape an unmarshalled booking item for the response"""
+    return {
+        'bookingId': booking['bookingId'],
+        'userId': booking['userId'],
+        'userEmail': booking.get('userEmail', ''),
+        'bikeId': booking['bikeId'],
+        'startDate': booking['startDate'],
+        'endDate': booking['endDate'],
+        'duration': int(booking['duration']),
+        'status': booking['status'],
+        'notes': booking.get('notes', ''),
+        'createdAt': booking['createdAt'],
+        'updatedAt': booking.get('updatedAt', ''),
+        'bikeModel': booking.get('bikeModel', 'Unknown'),
+        'bikeType': booking.get('bikeType', 'Unknown')
+    }
+
 def lambda_handler(event, context):
     """
     Get bookings for a user with optional filtering
@@ -20,210 +76,142 @@ def lambda_handler(event, context):
     try:
         # Extract user info from Cognito claims
         try:
-            # Debug the authorizer structure
-            logger.info(f"Full event structure: {json.dumps(event, default=str)}")
-            
-            authorizer = event.get('requestContext', {}).get('authorizer', {})
-            logger.info(f"Authorizer structure: {json.dumps(authorizer, default=str)}")
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                logger.debug("Full event structure: %s", json.dumps(event, default=str))
             
-            # For API Gateway v2 with JWT authorizer, claims are directly in the authorizer
-            # The structure is: authorizer.jwt.claims
-            if 'jwt' in authorizer and 'claims' in authorizer['jwt']:
-                claims = authorizer['jwt']['claims']
-                user_id = claims.get('sub', 'unknown')
-                user_email = claims.get('email', 'unknown@example.com')
-                user_groups = claims.get('cognito:groups', '')
-                logger.info(f"Extracted from jwt.claims - user_id: {user_id}, user_email: {user_email}, groups: {user_groups}")
-            elif 'claims' in authorizer:
-                # Fallback for different authorizer structure
-                claims = authorizer['claims']
-                user_id = claims.get('sub', 'unknown')
-                user_email = claims.get('email', 'unknown@example.com')
-                user_groups = claims.get('cognito:groups', '')
-                logger.info(f"Extracted from claims - user_id: {user_id}, user_email: {user_email}, groups: {user_groups}")
-            else:
-                # Last resort: try to extract from authorizer directly
-                user_id = authorizer.get('sub', 'unknown')
-                user_email = authorizer.get('email', 'unknown@example.com')
-                user_groups = authorizer.get('cognito:groups', '')
-                logger.info(f"Extracted from authorizer directly - user_id: {user_id}, user_email: {user_email}, groups: {user_groups}")
+            claims = get_claims(event)
+            user_id = claims.get('sub', 'unknown')
+            user_email = claims.get('email', 'unknown@example.com')
+            user_groups = claims.get('cognito:groups', '')
+            if debug:
+                logger.debug("Claims: %s", json.dumps(claims, default=str))
                 
             # Validate that we got a real user ID
             if user_id == 'unknown':
                 logger.error("Failed to extract user ID from JWT claims")
-                return {
-                    'statusCode': 401,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Invalid authentication token - user ID not found'
-                    })
-                }
+                return _resp(401, {'error': 'Invalid authentication token - user ID not found'})
             
         except (KeyError, TypeError) as e:
             logger.error(f"Error extracting user claims: {str(e)}")
-            return {
-                'statusCode': 401,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                    'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                },
-                'body': json.dumps({
-                    'error': 'Invalid authentication token'
-                })
-            }
+            return _resp(401, {'error': 'Invalid authentication token'})
         
         # Check if user is admin (BikeFranchise group)
-        is_admin = 'BikeFranchise' in user_groups
+        is_admin = 'BikeFranchise' in parse_groups(user_groups)
         
         # Parse query parameters
         query_params = event.get('queryStringParameters', {}) or {}
         status_filter = query_params.get('status')
         date_filter = query_params.get('date')
-        limit = int(query_params.get('limit', 50))
+        
+        # Clamp the page size so a huge limit cannot force an oversized read
+        try:
+            limit = min(max(int(query_params.get('limit') or 50), 1), 100)
+        except (TypeError, ValueError):
+            return _resp(400, {'error': 'Invalid limit'})
+        
+        # Resume from the key returned as nextCursor by the previous page. It has to
+        # belong to the index and partition this request reads, or DynamoDB rejects it
+        start_key = None
+        if query_params.get('cursor'):
+            if is_admin and status_filter:
+                cursor_schema = ('status', status_filter, 'createdAt')
+            elif is_admin:
+                cursor_schema = ('partitionShard', 'ALL', 'createdAt')
+            else:
+                cursor_schema = ('userId', user_id, 'bookingDate', date_filter or '')
+            try:
+                start_key = decode_cursor(query_params['cursor'], *cursor_schema)
+            except ValueError:
+                return _resp(400, {'error': 'Invalid cursor'})
         
         # Build query parameters
+        key_condition = 'userId = :userId'
+        expression_attribute_values = {':userId': {'S': user_id}}
+        
+        # bookingDate is the range key of UserBookingsIndex, so the date filter
+        # narrows the key range instead of being applied after the read
+        if date_filter:
+            key_condition += ' AND begins_with(bookingDate, :date)'
+            expression_attribute_values[':date'] = {'S': date_filter}
+        
         query_params_dynamo = {
             'TableName': bookings_table,
             'IndexName': 'UserBookingsIndex',
-            'KeyConditionExpression': 'userId = :userId',
-            'ExpressionAttributeValues': {
-                ':userId': {'S': user_id}
-            },
+            'KeyConditionExpression': key_condition,
+            'ExpressionAttributeValues': expression_attribute_values,
             'ScanIndexForward': False,  # Most recent first
-            'Limit': limit
+            'ProjectionExpression': BOOKING_PROJECTION,
+            'ExpressionAttributeNames': BOOKING_PROJECTION_NAMES
         }
         
         # Add status filter if provided
         if status_filter:
             query_params_dynamo['FilterExpression'] = '#status = :status'
-            query_params_dynamo['ExpressionAttributeNames'] = {
-                '#status': 'status'
-            }
             query_params_dynamo['ExpressionAttributeValues'][':status'] = {'S': status_filter}
         
-        # Add date filter if provided
-        if date_filter:
-            if 'FilterExpression' in query_params_dynamo:
-                query_params_dynamo['FilterExpression'] += ' AND begins_with(bookingDate, :date)'
-            else:
-                query_params_dynamo['FilterExpression'] = 'begins_with(bookingDate, :date)'
-            
-            if 'ExpressionAttributeNames' not in query_params_dynamo:
-                query_params_dynamo['ExpressionAttributeNames'] = {}
-            
-            query_params_dynamo['ExpressionAttributeValues'][':date'] = {'S': date_filter}
-        
         # If admin, get all bookings instead of user-specific
         if is_admin:
-            # Remove user-specific query and use scan instead
-            scan_params = {
-                'TableName': bookings_table,
-                'Limit': limit
-            }
-            
+            # Query the createdAt-ordered admin indexes instead of scanning the table;
+            # a status filter picks its own partition
             if status_filter:
-                scan_params['FilterExpression'] = '#status = :status'
-                scan_params['ExpressionAttributeNames'] = {
-                    '#status': 'status'
+                admin_params = {
+                    'IndexName': 'StatusCreatedAtIndex',
+                    'KeyConditionExpression': '#status = :status',
+                    'ExpressionAttributeValues': {':status': {'S': status_filter}}
                 }
-                scan_params['ExpressionAttributeValues'] = {
-                    ':status': {'S': status_filter}
+            else:
+                admin_params = {
+                    'IndexName': 'AllBookingsIndex',
+                    'KeyConditionExpression': 'partitionShard = :shard',
+                    'ExpressionAttributeValues': {':shard': {'S': 'ALL'}}
                 }
+            admin_params['TableName'] = bookings_table
+            admin_params['ScanIndexForward'] = False  # Most recent first
+            admin_params['ProjectionExpression'] = BOOKING_PROJECTION
+            admin_params['ExpressionAttributeNames'] = BOOKING_PROJECTION_NAMES
+            
+            # bookingDate is not a key of the admin indexes, so the date filter only
+            # narrows the one bounded page read_page returns; it never walks the index
+            if date_filter:
+                admin_params['FilterExpression'] = 'begins_with(bookingDate, :date)'
+                admin_params['ExpressionAttributeValues'][':date'] = {'S': date_filter}
+            
+            if start_key:
+                admin_params['ExclusiveStartKey'] = start_key
             
             try:
-                response = dynamodb.scan(**scan_params)
+                items, last_key = read_page(dynamodb.query, admin_params, limit)
             except Exception as e:
-                logger.error(f"Error scanning bookings for admin: {str(e)}")
-                return {
-                    'statusCode': 500,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Error retrieving bookings'
-                    })
-                }
+                logger.error(f"Error querying bookings for admin: {str(e)}")
+                return _resp(500, {'error': 'Error retrieving bookings'})
         else:
             # Regular user query
+            if start_key:
+                query_params_dynamo['ExclusiveStartKey'] = start_key
+            
             try:
-                response = dynamodb.query(**query_params_dynamo)
+                items, last_key = read_page(dynamodb.query, query_params_dynamo, limit)
             except Exception as e:
                 logger.error(f"Error querying bookings: {str(e)}")
-                return {
-                    'statusCode': 500,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                        'Access-Control-Allow-Methods': 'GET,OPTIONS'
-                    },
-                    'body': json.dumps({
-                        'error': 'Error retrieving bookings'
-                    })
-                }
+                return _resp(500, {'error': 'Error retrieving bookings'})
         
         # Process and format bookings
-        bookings = []
-        for item in response.get('Items', []):
-            booking = {
-                'bookingId': item['bookingId']['S'],
-                'userId': item['userId']['S'],
-                'userEmail': item.get('userEmail', {}).get('S', ''),
-                'bikeId': item['bikeId']['S'],
-                'startDate': item['startDate']['S'],
-                'endDate': item['endDate']['S'],
-                'duration': int(item['duration']['N']),
-                'status': item['status']['S'],
-                'notes': item.get('notes', {}).get('S', ''),
-                'createdAt': item['createdAt']['S'],
-                'updatedAt': item.get('updatedAt', {}).get('S', ''),
-                'bikeModel': item.get('bikeModel', {}).get('S', 'Unknown'),
-                'bikeType': item.get('bikeType', {}).get('S', 'Unknown')
-            }
-            bookings.append(booking)
+        bookings = [_format_booking(unmarshal(item)) for item in items]
         
-        # Sort bookings by creation date (newest first)
-        bookings.sort(key=lambda x: x['createdAt'], reverse=True)
+        # Bookings keep the index order so it holds across pages: newest createdAt
+        # first for admins, latest bookingDate (start day) first for users
         
         logger.info(f"Retrieved {len(bookings)} bookings for user {user_id}")
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS'
-            },
-            'body': json.dumps({
-                'bookings': bookings,
-                'count': len(bookings),
-                'userEmail': user_email,
-                'isAdmin': is_admin
-            })
-        }
+        return _resp(200, {
+            'bookings': bookings,
+            'count': len(bookings),
+            'nextCursor': encode_cursor(last_key),
+            'userEmail': user_email,
+            'isAdmin': is_admin
+        })
         
     except Exception as e:
         logger.error(f"Unexpected error in get_bookings_lambda: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS'
-            },
-            'body': json.dumps({
-                'error': 'Internal server error'
-            })
-        } 
\ No newline at end of file
+        return _resp(500, {'error': 'Internal server error'}) 
\ No newline at end of file
@@ -3,6 +3,7 @@ import boto3
 import os
 from datetime import datetime
 import logging
+from common.aws import parse_groups
 
 # Configure logging
 logger = logging.getLogger()
@@ -11,6 +12,7 @@ logger.setLevel(logging.INFO)
 # Initialize AWS clients
 dynamodb = boto3.client('dynamodb')
 bookings_table = os.environ['BOOKINGS_TABLE']
+bike_inventory_table = os.environ['BIKE_INVENTORY_TABLE']
 
 def lambda_handler(event, context):
     """
@@ -78,7 +80,7 @@ def lambda_handler(event, context):
             }
         
         # Check if user is admin (BikeFranchise group)
-        is_admin = 'BikeFranchise' in user_groups
+        is_admin = 'BikeFranchise' in parse_groups(user_groups)
         
         # Get booking ID from path parameters
         path_params = event.get('pathParameters', {}) or {}
@@ -167,6 +169,9 @@ def lambda_handler(event, context):
                 })
             }
         
+        # Read the clock once; it serves both the date checks and the update timestamp
+        now = datetime.utcnow()
+        
         # Prepare update expression and attribute values
         update_expression = "SET "
         expression_attribute_names = {}
@@ -183,8 +188,8 @@ def lambda_handler(event, context):
                 # Validate dates if updating
                 if field in ['startDate', 'endDate']:
                     try:
-                        field_datetime = datetime.fromisoformat(field_value.replace('Z', '+00:00'))
-                        if field == 'startDate' and field_datetime < datetime.now().replace(tzinfo=field_datetime.tzinfo):
+                        field_datetime = datetime.fromisoformat(field_value)
+                        if field == 'startDate' and field_datetime < now.replace(tzinfo=field_datetime.tzinfo):
                             return {
                                 'statusCode': 400,
                                 'headers': {
@@ -241,7 +246,7 @@ def lambda_handler(event, context):
                 updated_fields.append(field)
         
         # Add updatedAt timestamp
-        current_time = datetime.utcnow().isoformat() + 'Z'
+        current_time = now.isoformat() + 'Z'
         update_expression += "#updatedAt = :updatedAt"
         expression_attribute_names["#updatedAt"] = "updatedAt"
         expression_attribute_values[":updatedAt"] = {'S': current_time}
@@ -253,6 +258,27 @@ def lambda_handler(event, context):
             expression_attribute_values[":bookingDate"] = {'S': body['startDate'].split('T')[0]}
         
         try:
+            # create_booking skips its conflict query for requests starting after the
+            # bike's bookedUntil mark, so an extended booking must raise that mark first.
+            # Bumping bookingVersion with it fails any create_booking that read the old
+            # mark (in flight or from its bike cache) and makes it re-read the bike
+            if 'endDate' in body:
+                try:
+                    dynamodb.update_item(
+                        TableName=bike_inventory_table,
+                        Key={'bikeId': existing_booking['bikeId']},
+                        UpdateExpression="SET bookedUntil = :endDate, bookingVersion = if_not_exists(bookingVersion, :zero) + :one",
+                        ConditionExpression="bookedUntil < :endDate",
+                        ExpressionAttributeValues={
+                            ':endDate': {'S': body['endDate']},
+                            ':zero': {'N': '0'},
+                            ':one': {'N': '1'}
+                        }
+                    )
+                except dynamodb.exceptions.ConditionalCheckFailedException:
+                    # Mark is already later, or the bike has none and is always checked
+                    pass
+            
             # Perform the update
             dynamodb.update_item(
                 TableName=bookings_table,
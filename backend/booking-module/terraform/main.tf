@@ -30,6 +30,21 @@ resource "aws_dynamodb_table" "bookings_table" {
     type = "S"
   }
 
+  attribute {
+    name = "createdAt"
+    type = "S"
+  }
+
+  attribute {
+    name = "status"
+    type = "S"
+  }
+
+  attribute {
+    name = "partitionShard"
+    type = "S"
+  }
+
   # Global Secondary Index for user bookings
   global_secondary_index {
     name            = "UserBookingsIndex"
@@ -46,6 +61,27 @@ resource "aws_dynamodb_table" "bookings_table" {
     projection_type = "ALL"
   }
 
+  # Global Secondary Index for the admin listing, newest first; every booking is
+  # written with partitionShard = "ALL"
+  global_secondary_index {
+    name            = "AllBookingsIndex"
+    hash_key        = "partitionShard"
+    range_key       = "createdAt"
+    projection_type = "ALL"
+  }
+
+  # Global Secondary Index for the admin listing filtered by status
+  global_secondary_index {
+    name            = "StatusCreatedAtIndex"
+    hash_key        = "status"
+    range_key       = "createdAt"
+    projection_type = "ALL"
+  }
+
+  # New bookings are fanned out to the confirmation email from the stream
+  stream_enabled   = true
+  stream_view_type = "NEW_IMAGE"
+
   tags = {
     Environment = "dev"
     Project     = "DALScooter"
@@ -84,14 +120,29 @@ data "archive_file" "get_booking_details_zip" {
   output_path = "${path.module}/../lambdas/get_booking_details_lambda.zip"
 }
 
+data "archive_file" "booking_notification_zip" {
+  type        = "zip"
+  source_file = "${path.module}/../lambdas/booking_notification_lambda.py"
+  output_path = "${path.module}/../lambdas/booking_notification_lambda.zip"
+}
+
+data "archive_file" "backfill_partition_shard_zip" {
+  type        = "zip"
+  source_file = "${path.module}/../lambdas/backfill_partition_shard_lambda.py"
+  output_path = "${path.module}/../lambdas/backfill_partition_shard_lambda.zip"
+}
+
 # Lambda Functions
 resource "aws_lambda_function" "create_booking_lambda" {
   function_name = "DALScooterCreateBookingLambda"
   filename      = data.archive_file.create_booking_zip.output_path
   handler       = "create_booking_lambda.lambda_handler"
   runtime       = "python3.11"
+  layers        = [var.common_layer_arn]
   role          = "arn:aws:iam::${data.aws_caller_identity.current.account_id}:role/LabRole"
   timeout       = 60
+  # CPU scales with memory; the default 128 MB makes importing boto3 the bulk of a cold start
+  memory_size   = 512
   source_code_hash = data.archive_file.create_booking_zip.output_base64sha256
 
   environment {
@@ -115,6 +166,7 @@ resource "aws_lambda_function" "get_bookings_lambda" {
   filename      = data.archive_file.get_bookings_zip.output_path
   handler       = "get_bookings_lambda.lambda_handler"
   runtime       = "python3.11"
+  layers        = [var.common_layer_arn]
   role          = "arn:aws:iam::${data.aws_caller_identity.current.account_id}:role/LabRole"
   timeout       = 60
   source_code_hash = data.archive_file.get_bookings_zip.output_base64sha256
@@ -138,6 +190,7 @@ resource "aws_lambda_function" "update_booking_lambda" {
   filename      = data.archive_file.update_booking_zip.output_path
   handler       = "update_booking_lambda.lambda_handler"
   runtime       = "python3.11"
+  layers        = [var.common_layer_arn]
   role          = "arn:aws:iam::${data.aws_caller_identity.current.account_id}:role/LabRole"
   timeout       = 60
   source_code_hash = data.archive_file.update_booking_zip.output_base64sha256
@@ -145,6 +198,7 @@ resource "aws_lambda_function" "update_booking_lambda" {
   environment {
     variables = {
       BOOKINGS_TABLE = aws_dynamodb_table.bookings_table.name
+      BIKE_INVENTORY_TABLE = "BikeInventoryTable"
     }
   }
 
@@ -161,6 +215,7 @@ resource "aws_lambda_function" "cancel_booking_lambda" {
   filename      = data.archive_file.cancel_booking_zip.output_path
   handler       = "cancel_booking_lambda.lambda_handler"
   runtime       = "python3.11"
+  layers        = [var.common_layer_arn]
   role          = "arn:aws:iam::${data.aws_caller_identity.current.account_id}:role/LabRole"
   timeout       = 60
   source_code_hash = data.archive_file.cancel_booking_zip.output_base64sha256
@@ -184,6 +239,7 @@ resource "aws_lambda_function" "get_booking_details_lambda" {
   filename      = data.archive_file.get_booking_details_zip.output_path
   handler       = "get_booking_details_lambda.lambda_handler"
   runtime       = "python3.11"
+  layers        = [var.common_layer_arn]
   role          = "arn:aws:iam::${data.aws_caller_identity.current.account_id}:role/LabRole"
   timeout       = 60
   source_code_hash = data.archive_file.get_booking_details_zip.output_base64sha256
@@ -202,6 +258,72 @@ resource "aws_lambda_function" "get_booking_details_lambda" {
   }
 }
 
+resource "aws_lambda_function" "booking_notification_lambda" {
+  function_name = "DALScooterBookingNotificationLambda"
+  filename      = data.archive_file.booking_notification_zip.output_path
+  handler       = "booking_notification_lambda.lambda_handler"
+  runtime       = "python3.11"
+  layers        = [var.common_layer_arn]
+  role          = "arn:aws:iam::${data.aws_caller_identity.current.account_id}:role/LabRole"
+  timeout       = 60
+  source_code_hash = data.archive_file.booking_notification_zip.output_base64sha256
+
+  environment {
+    variables = {
+      SNS_TOPIC_ARN = var.sns_topic_arn
+    }
+  }
+
+  depends_on = [data.archive_file.booking_notification_zip]
+}
+
+resource "aws_lambda_function" "backfill_partition_shard_lambda" {
+  function_name = "DALScooterBackfillPartitionShardLambda"
+  filename      = data.archive_file.backfill_partition_shard_zip.output_path
+  handler       = "backfill_partition_shard_lambda.lambda_handler"
+  runtime       = "python3.11"
+  layers        = [var.common_layer_arn]
+  role          = "arn:aws:iam::${data.aws_caller_identity.current.account_id}:role/LabRole"
+  timeout       = 900
+  source_code_hash = data.archive_file.backfill_partition_shard_zip.output_base64sha256
+
+  environment {
+    variables = {
+      BOOKINGS_TABLE = aws_dynamodb_table.bookings_table.name
+    }
+  }
+
+  depends_on = [data.archive_file.backfill_partition_shard_zip]
+}
+
+# Run the partitionShard backfill as part of the deploy, so AllBookingsIndex lists
+# bookings created before it existed without a manual step
+resource "aws_lambda_invocation" "backfill_partition_shard" {
+  function_name = aws_lambda_function.backfill_partition_shard_lambda.function_name
+  input         = jsonencode({})
+
+  triggers = {
+    source_code_hash = data.archive_file.backfill_partition_shard_zip.output_base64sha256
+  }
+
+  depends_on = [aws_dynamodb_table.bookings_table]
+}
+
+# Booking confirmations are sent from the bookings table stream
+resource "aws_lambda_event_source_mapping" "booking_notification_from_stream" {
+  event_source_arn  = aws_dynamodb_table.bookings_table.stream_arn
+  function_name     = aws_lambda_function.booking_notification_lambda.function_name
+  starting_position = "LATEST"
+  batch_size        = 10
+  enabled           = true
+
+  filter_criteria {
+    filter {
+      pattern = jsonencode({ eventName = ["INSERT"] })
+    }
+  }
+}
+
 # API Gateway
 resource "aws_apigatewayv2_api" "booking_api" {
   name          = "DALScooterBookingAPI"
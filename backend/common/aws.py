@@ -0,0 +1,101 @@
+"""
+Shared AWS plumbing for the DALScooter Lambdas.
+
+Shipped as a Lambda Layer (/opt/python/common), so handlers import it with
+`from common.aws import ...` and a warm container builds the clients, the
+JSON encoder and the DynamoDB type (de)serializers only once.
+"""
+import json
+import boto3
+from botocore.config import Config
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from decimal import Decimal
+
+# Keep-alive lets warm invocations reuse the TLS connection
+BOTO_CONFIG = Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={"max_attempts": 3, "mode": "adaptive"}
+)
+
+# The low-level client is the resource's own client, so both share one
+# service model and one connection pool
+DDB_RESOURCE = boto3.resource("dynamodb", config=BOTO_CONFIG)
+DDB_CLIENT = DDB_RESOURCE.meta.client
+
+SERIALIZER = TypeSerializer()
+DESERIALIZER = TypeDeserializer()
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Only the booking attributes the API returns are read; index keys such as
+# bookingDate and partitionShard stay in the table. status and duration are
+# reserved words
+BOOKING_PROJECTION = (
+    "bookingId, userId, userEmail, bikeId, startDate, endDate, #duration, "
+    "#status, notes, createdAt, updatedAt, bikeModel, bikeType"
+)
+BOOKING_PROJECTION_NAMES = {"#status": "status", "#duration": "duration"}
+
+
+def cors_headers(methods):
+    """
+    Response headers for an API route the frontend calls cross-origin; build them
+    once per container and pass them to respond(), e.g. via functools.partial
+    """
+    return {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+        "Access-Control-Allow-Methods": methods
+    }
+
+
+def decimal_default(o):
+    if isinstance(o, Decimal):
+        return float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+# Shared response encoder; json.dumps(cls=...) builds a new encoder on every call.
+# Response bodies are freshly built acyclic trees, so the cycle check is skipped
+JSON_ENCODER = json.JSONEncoder(default=decimal_default, separators=(",", ":"), check_circular=False)
+
+
+def respond(status, body, headers=JSON_HEADERS):
+    return {
+        "statusCode": status,
+        "headers": headers,
+        "body": JSON_ENCODER.encode(body)
+    }
+
+
+def parse_body(event):
+    # DynamoDB rejects Python floats, so parse JSON numbers straight into Decimal
+    return json.loads(event["body"], parse_float=Decimal)
+
+
+def get_claims(event):
+    """
+    Return the Cognito claims of an API Gateway request in one pass: HTTP API JWT
+    authorizers nest them under authorizer.jwt.claims, other authorizers under
+    authorizer.claims or directly on the authorizer
+    """
+    authorizer = (event.get("requestContext") or {}).get("authorizer") or {}
+    return (authorizer.get("jwt") or {}).get("claims") or authorizer.get("claims") or authorizer
+
+
+def parse_groups(groups):
+    """
+    Return the caller's Cognito groups as a frozenset. HTTP API JWT authorizers
+    pass cognito:groups as one string such as "[BikeFranchise Admins]", other
+    authorizers as a list
+    """
+    if isinstance(groups, str):
+        groups = groups.strip("[]").replace(",", " ").split()
+    return frozenset(groups or ())
+
+
+def unmarshal(item):
+    """Convert a low-level DynamoDB item ({'S': ...}, {'N': ...}) into plain Python values"""
+    return {key: DESERIALIZER.deserialize(value) for key, value in item.items()}
@@ -0,0 +1,22 @@
+# Shared Python code for the module Lambdas, importable as `common.*`
+data "archive_file" "common_layer" {
+  type        = "zip"
+  output_path = "${path.module}/../common_layer.zip"
+
+  source {
+    content  = file("${path.module}/../__init__.py")
+    filename = "python/common/__init__.py"
+  }
+
+  source {
+    content  = file("${path.module}/../aws.py")
+    filename = "python/common/aws.py"
+  }
+}
+
+resource "aws_lambda_layer_version" "common" {
+  layer_name          = "DALScooterCommon"
+  filename            = data.archive_file.common_layer.output_path
+  source_code_hash    = data.archive_file.common_layer.output_base64sha256
+  compatible_runtimes = ["python3.11"]
+}
@@ -0,0 +1,3 @@
+output "layer_arn" {
+  value = aws_lambda_layer_version.common.arn
+}
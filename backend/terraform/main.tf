@@ -22,12 +22,18 @@ module "amplify_deploy" {
   booking_api               = module.booking_module.booking_api_gateway_endpoint
 }
 
+# Shared Lambda Layer (backend/common)
+module "common_layer" {
+  source = "../common/terraform"
+}
+
 # Bike Module (Admin & Guest CRUD access)
 module "bike_module" {
   source                     = "../bike-module/terraform"
   aws_region                = var.aws_region
   cognito_user_pool_id      = module.auth_module.user_pool_id
   cognito_user_pool_client_id = module.auth_module.user_pool_client_id
+  common_layer_arn          = module.common_layer.layer_arn
 }
 
 # Feedback Module
@@ -52,4 +58,5 @@ module "booking_module" {
   cognito_user_pool_id          = module.auth_module.user_pool_id
   cognito_user_pool_client_id   = module.auth_module.user_pool_client_id
   sns_topic_arn                 = module.auth_module.sns_topic_arn
+  common_layer_arn              = module.common_layer.layer_arn
 }
\ No newline at end of file